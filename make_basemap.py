@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用本地 Natural Earth shapefile 预渲染跑步地图的静态底图（陆地、海洋、海岸线）。
+输出:
+  - data/basemap.png
+  - data/basemap.json  底图覆盖的经纬度范围
+注意:
+  - 只需在跑步范围超出现有底图时运行一次；render.py 发现底图缺失或覆盖不足时也会自动调用
+"""
+
+from __future__ import annotations
+import json
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import shapely
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+from cartopy.io.shapereader import Reader
+
+from render import BASEMAP_EXTENT, BASEMAP_PNG, get_map_extent, get_running_data
+
+# ---- 配置 ----
+# 本地 shapefile 目录
+SHAPEFILE_DIR = Path("data/ne_50m/")
+# 简化 shapefile 几何的容差（度）
+SIMPLIFY_TOLERANCE = 0.05
+# 底图较长一边的像素数
+BASEMAP_SIZE = 1200
+
+
+def load_layer(layer: str, extent: tuple[float, float, float, float]) -> np.ndarray:
+    """只流式读取与 extent 相交的要素，并做简化；其余要素不会被解析成几何对象"""
+    lng_min, lng_max, lat_min, lat_max = extent
+    reader = Reader(
+        SHAPEFILE_DIR / layer / f"{layer}.shp", bbox=(lng_min, lat_min, lng_max, lat_max)
+    )
+    geometries = np.fromiter(reader.geometries(), dtype=object)
+    return shapely.simplify(geometries, SIMPLIFY_TOLERANCE)
+
+
+def build_basemap(extent: tuple[float, float, float, float]) -> None:
+    """按 (lng_min, lng_max, lat_min, lat_max) 渲染底图并记录其范围"""
+    lng_min, lng_max, lat_min, lat_max = extent
+    aspect = (lng_max - lng_min) / (lat_max - lat_min)
+    dpi = 100
+    if aspect >= 1:
+        figsize = (BASEMAP_SIZE / dpi, BASEMAP_SIZE / dpi / aspect)
+    else:
+        figsize = (BASEMAP_SIZE / dpi * aspect, BASEMAP_SIZE / dpi)
+
+    with plt.style.context("default"):
+        fig = plt.figure(figsize=figsize)
+        # 坐标轴铺满整张图，图片像素与经纬度范围一一对应
+        ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.PlateCarree())
+        ax.set_extent(extent, crs=ccrs.PlateCarree())
+        ax.spines["geo"].set_visible(False)
+        ax.add_feature(cfeature.ShapelyFeature(
+            load_layer("ne_50m_land", extent),
+            ccrs.PlateCarree(),
+            facecolor="#d0e1c8",
+            zorder=1
+        ))
+        ax.add_feature(cfeature.ShapelyFeature(
+            load_layer("ne_50m_ocean", extent),
+            ccrs.PlateCarree(),
+            facecolor="#c7ddef",
+            zorder=1
+        ))
+        ax.add_feature(cfeature.ShapelyFeature(
+            load_layer("ne_50m_coastline", extent),
+            ccrs.PlateCarree(),
+            linewidth=0.5,
+            facecolor="#9b9b9b",
+            zorder=2
+        ))
+        fig.savefig(BASEMAP_PNG, dpi=dpi)
+        plt.close(fig)
+
+    with open(BASEMAP_EXTENT, "w", encoding="utf8") as fw:
+        json.dump({"extent": list(extent)}, fw)
+    print(f"Basemap written to {BASEMAP_PNG}, extent: {extent}")
+
+
+if __name__ == "__main__":
+    _, _, _, _, start_lats, start_lngs = get_running_data()
+    build_basemap(get_map_extent(start_lats, start_lngs))
@@ -5,11 +5,14 @@
 """
 
 from __future__ import annotations
-import math
 import calendar
+import contextlib
+import hashlib
+import json
+import os
+from functools import lru_cache
 from pathlib import Path
-from typing import Callable, Optional, TypeVar
-from dateutil.relativedelta import relativedelta
+from typing import Optional
 from datetime import datetime
 
 import matplotlib
@@ -17,31 +20,69 @@ import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import matplotlib.ticker as tick
 import numpy as np
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
-from cartopy.io.shapereader import Reader
+import pandas as pd
 from matplotlib.offsetbox import AnnotationBbox, OffsetImage
 
-T = TypeVar("T")
-K = TypeVar("K")
-
 # ---- 配置 ----
 CSV_FILE = Path("data/running.csv")
 OUT_SVG = Path("running.svg")
+OUT_PNG = Path("running.png")
+# 输出格式：svg（默认，xkcd 风格）或 png（更快，无 xkcd 风格），由环境变量 RENDER_FORMAT 指定
+OUT_FORMAT = os.environ.get("RENDER_FORMAT", "svg").lower()
+# 地图等栅格化图层在 SVG 中嵌入的分辨率
+DPI = 150
 RUNNER = "wanshuo"
-# 本地 shapefile 目录
-SHAPEFILE_DIR = Path("data/ne_50m/")
+RUNNER_IMG = Path("runner.png")
+# 由 make_basemap.py 预渲染的地图底图及其经纬度范围
+BASEMAP_PNG = Path("data/basemap.png")
+BASEMAP_EXTENT = Path("data/basemap.json")
+
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def get_map_extent(
+        start_lats: np.ndarray, start_lngs: np.ndarray
+) -> tuple[float, float, float, float]:
+    """返回地图范围 (lng_min, lng_max, lat_min, lat_max)，带动态边距"""
+    if not len(start_lats) or not len(start_lngs):
+        return -180.0, 180.0, -90.0, 90.0
+    lat_min, lat_max = float(start_lats.min()), float(start_lats.max())
+    lng_min, lng_max = float(start_lngs.min()), float(start_lngs.max())
+    lat_margin = 1.0 if lat_max - lat_min < 10 else 2.0
+    lng_margin = 1.0 if lng_max - lng_min < 10 else 2.0
+    return (
+        max(lng_min - lng_margin, -180.0),
+        min(lng_max + lng_margin, 180.0),
+        max(lat_min - lat_margin, -90.0),
+        min(lat_max + lat_margin, 90.0),
+    )
 
 
-def groupby(data: list[T], key_func: Callable[[T], K]) -> dict[K, list[T]]:
-    grouped_data = {}
-    for item in data:
-        key = key_func(item)
-        if key in grouped_data:
-            grouped_data[key].append(item)
-        else:
-            grouped_data[key] = [item]
-    return grouped_data
+def load_basemap(
+        extent: tuple[float, float, float, float]
+) -> tuple[np.ndarray, tuple[float, float, float, float]]:
+    """读取预渲染的底图及其范围；底图缺失或覆盖不了 extent 时重新生成"""
+    if BASEMAP_PNG.exists() and BASEMAP_EXTENT.exists():
+        with open(BASEMAP_EXTENT, encoding="utf8") as f:
+            basemap_extent = tuple(json.load(f)["extent"])
+        lng_min, lng_max, lat_min, lat_max = basemap_extent
+        if (
+                lng_min <= extent[0] and lng_max >= extent[1]
+                and lat_min <= extent[2] and lat_max >= extent[3]
+        ):
+            return plt.imread(BASEMAP_PNG), basemap_extent
+
+    # cartopy 只在生成底图时需要
+    from make_basemap import build_basemap
+
+    build_basemap(extent)
+    return plt.imread(BASEMAP_PNG), extent
+
+
+@lru_cache(maxsize=1)
+def load_runner_img() -> np.ndarray:
+    """跑步者图片只解码一次，多次绘图时复用同一份像素数据"""
+    return plt.imread(RUNNER_IMG)
 
 
 def get_days_monthly(
@@ -49,44 +90,37 @@ def get_days_monthly(
         year_end: int,
         month_start: Optional[int] = None,
         month_end: Optional[int] = None,
-) -> dict[int, int]:
-    days_monthly = {}
-    for y in range(year_start, year_end + 1):
-        for m in range(
-                month_start if month_start and y == year_start else 1,
-                (month_end if month_end and y == year_end else 12) + 1,
-        ):
-            days = calendar.monthrange(y, m)[1]
-            if m in days_monthly:
-                days_monthly[m] += days
-            else:
-                days_monthly[m] = days
+) -> np.ndarray:
+    """返回区间内 1~12 月各自的总天数"""
+    month_start = month_start or 1
+    month_end = month_end or 12
+    months = np.arange(1, 13)
+    # 每个月份在区间内出现的年数，首尾两年只计入覆盖到的月份
+    n_years = (year_end - year_start + 1) - (months < month_start) - (months > month_end)
+    days_monthly = DAYS_IN_MONTH * n_years
+    # 闰年的二月多一天
+    leap_first = year_start if month_start <= 2 else year_start + 1
+    leap_last = year_end if month_end >= 2 else year_end - 1
+    days_monthly[1] += calendar.leapdays(leap_first, leap_last + 1)
     return days_monthly
 
 
-def get_attendance(dts: list[datetime]) -> tuple[list[float], list[float]]:
-    dts_all_monthly = groupby(dts, lambda d: d.month)
+def get_attendance(
+        dts: np.ndarray, this_year_mask: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    months = dts.astype("datetime64[M]").astype(int) % 12
+    first, last = dts[[0, -1]].astype(datetime)
     this_year = datetime.now().year
-    dts_this_year = [d for d in dts if d.year == this_year]
-    dts_this_year_monthly = groupby(dts_this_year, lambda d: d.month)
-    days_all_monthly = get_days_monthly(
-        dts[0].year, dts[-1].year, dts[0].month, dts[-1].month
+    # 一次 bincount 同时统计：前 12 个桶为往年各月次数，后 12 个桶为今年各月次数
+    counts = np.bincount(months + 12 * this_year_mask, minlength=24)
+    counts_this_year = counts[12:]
+    counts_all = counts[:12] + counts_this_year
+    days_all = get_days_monthly(first.year, last.year, first.month, last.month)
+    days_this_year = get_days_monthly(this_year, this_year)
+    attendance_all = np.divide(
+        counts_all * 100, days_all, out=np.zeros(12), where=days_all > 0
     )
-    days_this_year_monthly = get_days_monthly(this_year, this_year)
-    attendance_all = []
-    attendance_this_year = []
-    for m in range(1, 13):
-        if m in dts_all_monthly:
-            attendance_all.append(len(dts_all_monthly[m]) / days_all_monthly[m] * 100)
-        else:
-            attendance_all.append(0.0)
-
-        if m in dts_this_year_monthly:
-            attendance_this_year.append(
-                len(dts_this_year_monthly[m]) / days_this_year_monthly[m] * 100
-            )
-        else:
-            attendance_this_year.append(0.0)
+    attendance_this_year = counts_this_year / days_this_year * 100
 
     return attendance_all, attendance_this_year
 
@@ -97,89 +131,99 @@ def pace_label_fmt(val: float, pos) -> str:
     return f"{min:.0f}'{sec:.0f}\""
 
 
-def make_circular(lst: list[T]) -> list[T]:
-    if len(lst) > 1:
-        lst.append(lst[0])
-    return lst
+def make_circular(arr: np.ndarray) -> np.ndarray:
+    """首尾相接：返回末尾追加首元素的新数组，不修改输入"""
+    if len(arr) > 1:
+        return np.r_[arr, arr[:1]]
+    return np.asarray(arr)
 
 
 def get_running_data() -> tuple[
-    list[datetime], list[float], list[float], list[int], list[float], list[float]
+    np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray
 ]:
     """返回 dts, accs, distances, paces, start_lats, start_lngs"""
-    data = []
-    with open(CSV_FILE) as file:
-        for line in file:
-            cols = line.rstrip().split(",")
-            if cols[0] == "DT":
-                continue
-            dt = datetime.strptime(cols[0], "%Y-%m-%d %H:%M:%S")
-            distance = float(cols[1])
-            mins, secs = [int(i) for i in cols[3].split(":")]
-            if secs == 60:
-                mins = mins + 1
-                secs = 0
-            # 处理纬度和经度，跳过空值或无效值
-            try:
-                start_lat = float(cols[4]) if len(cols) > 4 and cols[4].strip() else None
-                start_lng = float(cols[5]) if len(cols) > 5 and cols[5].strip() else None
-                # 如果纬度或经度为空或无效，跳过该行
-                if start_lat is None or start_lng is None:
-                    print(f"Skipping row with DT={cols[0]} due to invalid lat/lng: {cols[4:6]}")
-                    continue
-            except ValueError as e:
-                print(f"Skipping row with DT={cols[0]} due to ValueError: {e}, cols={cols[4:6]}")
-                continue
-            if distance <= 0.0:
-                continue
-            data.append((dt, distance, mins * 60 + secs, start_lat, start_lng))
-    data.sort(key=lambda t: t[0])
-    acc = 0.0
-    dts = []
-    accs = []
-    distances = []
-    paces = []
-    start_lats = []
-    start_lngs = []
-    for dt, distance, pace, start_lat, start_lng in data:
-        acc += distance
-        dts.append(dt)
-        accs.append(acc)
-        distances.append(distance)
-        paces.append(pace)
-        start_lats.append(start_lat)
-        start_lngs.append(start_lng)
+    # 跳过不用的心率列，并直接指定列类型，省去 pandas 的类型推断
+    df = pd.read_csv(
+        CSV_FILE,
+        header=0,
+        names=["DT", "dist", "heart", "pace", "lat", "lng"],
+        usecols=["DT", "dist", "pace", "lat", "lng"],
+        dtype={"DT": str, "dist": np.float64, "pace": str},
+    )
+    df["DT"] = pd.to_datetime(df.DT, format="%Y-%m-%d %H:%M:%S", cache=True)
+    # m:60 与 (m+1):00 折算成秒数相同，不需要单独处理进位
+    pace = df.pace.str.split(":", expand=True).astype(int).to_numpy()
+    df["pace"] = pace[:, 0] * 60 + pace[:, 1]
+    # 处理纬度和经度，跳过空值或无效值
+    df["lat"] = pd.to_numeric(df.lat, errors="coerce")
+    df["lng"] = pd.to_numeric(df.lng, errors="coerce")
+    invalid = df.lat.isna() | df.lng.isna()
+    if invalid.any():
+        print(f"Skipping {invalid.sum()} rows due to invalid lat/lng")
+    df = df[~invalid & (df.dist > 0)].sort_values("DT", kind="stable")
+    dts = df.DT.to_numpy().astype("datetime64[s]")
+    distances = df.dist.to_numpy()
+    accs = distances.cumsum()
     # 调试: 打印有效点的数量
-    print(f"Total valid points: {len(start_lats)}")
-    return dts, accs, distances, paces, start_lats, start_lngs
+    print(f"Total valid points: {len(df)}")
+    return (
+        dts,
+        accs,
+        distances,
+        df.pace.to_numpy(),
+        df.lat.to_numpy(),
+        df.lng.to_numpy(),
+    )
 
 
-def get_last_12_months_distances(dts: list[datetime], distances: list[float]) -> list[tuple[str, float]]:
+def get_last_12_months_distances(dts: np.ndarray, distances: np.ndarray) -> list[tuple[str, float]]:
     """Calculate total distance for each of the last 12 months."""
     today = datetime.now()
-    last_12_months = []
 
-    # 生成最近12个月的年月列表
-    for i in range(11, -1, -1):
-        month_date = today - relativedelta(months=i)
-        year_month = month_date.strftime("%Y-%m")
-        last_12_months.append((year_month, 0.0))
+    # 最近12个月的整数键 year*12+month-1，避免逐行 strftime
+    this_month = today.year * 12 + today.month - 1
+    first_month = this_month - 11
+    # dts 已按时间排序，二分查找窗口边界，窗口外的历史记录不再逐个访问
+    bounds = np.array([first_month, this_month + 1]) - 1970 * 12
+    start, end = np.searchsorted(dts, bounds.astype("datetime64[M]").astype(dts.dtype))
+    keys = dts[start:end].astype("datetime64[M]").astype(int) + 1970 * 12
+    totals = np.bincount(
+        keys - first_month, weights=distances[start:end], minlength=12
+    )
 
-    # 按年月分组跑步数据
-    monthly_distances = groupby(zip(dts, distances), lambda x: x[0].strftime("%Y-%m"))
+    return [
+        (f"{k // 12:04d}-{k % 12 + 1:02d}", float(total))
+        for k, total in zip(range(first_month, this_month + 1), totals)
+    ]
 
-    # 累加每个月的跑量
-    for year_month, _ in last_12_months:
-        if year_month in monthly_distances:
-            total_distance = sum(dist for _, dist in monthly_distances[year_month])
-            last_12_months = [(ym, total_distance if ym == year_month else dist) for ym, dist in last_12_months]
 
-    print("Generated months:", last_12_months)
-    return last_12_months
+def get_inputs_digest(out: Path) -> str:
+    """渲染输入的摘要：数据、图片、底图、本脚本、输出格式及当前年月"""
+    h = hashlib.blake2b(digest_size=16)
+    for path in (CSV_FILE, RUNNER_IMG, BASEMAP_PNG, BASEMAP_EXTENT, Path(__file__)):
+        if path.exists():
+            h.update(path.read_bytes())
+    # 今年和最近12个月的统计依赖当前日期
+    h.update(f"{out.suffix}|{datetime.now():%Y-%m}".encode())
+    return h.hexdigest()
 
 
 def plot_running() -> None:
-    with plt.xkcd():
+    png = OUT_FORMAT == "png"
+    out = OUT_PNG if png else OUT_SVG
+    # 输入没有变化时跳过渲染；删除 .hash 文件可强制重新生成
+    hash_file = out.with_name(out.name + ".hash")
+    digest = get_inputs_digest(out)
+    if out.exists() and hash_file.exists() and hash_file.read_text() == digest:
+        print(f"{out} is up to date, skipping render")
+        return
+
+    # PNG 直接由 Agg 栅格化，省去 xkcd 对每条路径的抖动处理；SVG 保留 xkcd 风格
+    style = contextlib.nullcontext() if png else plt.xkcd()
+    # 合并近似共线的顶点以减小 SVG 体积；固定 hashsalt 让元素 id 在多次生成间保持不变
+    with style, matplotlib.rc_context(
+        {"path.simplify_threshold": 1.0, "svg.hashsalt": RUNNER}
+    ):
         fig, ax = plt.subplots(figsize=(8, 5), constrained_layout=True)
         ax.spines[["top", "right"]].set_visible(False)
         locator = mdates.AutoDateLocator(minticks=3, maxticks=7)
@@ -191,7 +235,10 @@ def plot_running() -> None:
         ax.set_title("running")
 
         dts, accs, distances, paces, start_lats, start_lngs = get_running_data()
+        run_years = dts.astype("datetime64[Y]").astype(int) + 1970
         this_year = datetime.now().year
+        # 今年的记录只筛选一次，配速、跑量和出勤率共用
+        this_year_mask = run_years == this_year
 
         ax.plot(dts, accs, color="#d62728")
 
@@ -205,7 +252,7 @@ def plot_running() -> None:
             showextrema=False,
             side="low",
         )
-        paces_this_year = [paces[i] for i, dt in enumerate(dts) if dt.year == this_year]
+        paces_this_year = paces[this_year_mask]
         v_year = ax_pace.violinplot(
             paces_this_year,
             orientation="horizontal",
@@ -241,8 +288,8 @@ def plot_running() -> None:
         ax_pace.xaxis.set_major_formatter(tick.FuncFormatter(pace_label_fmt))
 
         # 出勤率雷达图
-        attendance_all, attendance_this_year = tuple(
-            map(make_circular, get_attendance(dts))
+        attendance_all, attendance_this_year = map(
+            make_circular, get_attendance(dts, this_year_mask)
         )
         feature = make_circular(
             [
@@ -260,8 +307,8 @@ def plot_running() -> None:
                 "",
             ]
         )
-        angles_deg = make_circular([a for a in range(0, 360, 30)])
-        angles_rad = make_circular([a * math.pi / 180 for a in range(0, 360, 30)])
+        angles_deg = make_circular(np.arange(0, 360, 30))
+        angles_rad = np.deg2rad(angles_deg)
 
         ax_att = plt.axes([0.1, 0.28, 0.25, 0.25], polar=True)
         ax_att.plot(angles_rad, attendance_all, "-", linewidth=1, color="#ff7f0e")
@@ -282,10 +329,8 @@ def plot_running() -> None:
         ax_att.grid(visible=True, lw=0.5, ls="--")
 
         # 信息文字
-        years = dts[-1].year - dts[0].year + 1
-        distance_this_year = sum(
-            [distances[i] for i, dt in enumerate(dts) if dt.year == this_year]
-        )
+        years = run_years[-1] - run_years[0] + 1
+        distance_this_year = distances[this_year_mask].sum()
         fig.text(
             0.99,
             0.41,
@@ -294,7 +339,7 @@ def plot_running() -> None:
             f"{len(dts)} times\n"
             f"total {accs[-1]:.2f}Km\n"
             f"this year {distance_this_year:.2f}Km\n"
-            f"latest {dts[-1]: %Y-%m-%d} {distances[-1]:.2f}Km",
+            f"latest {dts[-1].astype(datetime): %Y-%m-%d} {distances[-1]:.2f}Km",
             ha="right",
             va="bottom",
             fontsize="x-small",
@@ -317,84 +362,61 @@ def plot_running() -> None:
         ax_bar.tick_params(axis="x", which="major", labelsize=6, width=0.5, color="grey")
         ax_bar.tick_params(axis="y", which="major", labelsize=6, width=0.5, color="grey")
 
-        # 地图上的跑步起始点（使用本地 shapefile）
-        ax_loc = plt.axes([0.75, 0.1, 0.3, 0.3], projection=ccrs.PlateCarree())
-        # 使用本地 shapefile，设置较低 zorder
-        ax_loc.add_feature(cfeature.ShapelyFeature(
-            Reader(SHAPEFILE_DIR / "ne_50m_land/ne_50m_land.shp").geometries(),
-            ccrs.PlateCarree(),
-            facecolor="#d0e1c8",
-            zorder=1
-        ))
-        ax_loc.add_feature(cfeature.ShapelyFeature(
-            Reader(SHAPEFILE_DIR / "ne_50m_ocean/ne_50m_ocean.shp").geometries(),
-            ccrs.PlateCarree(),
-            facecolor="#c7ddef",
-            zorder=1
-        ))
-        ax_loc.add_feature(cfeature.ShapelyFeature(
-            Reader(SHAPEFILE_DIR / "ne_50m_coastline/ne_50m_coastline.shp").geometries(),
-            ccrs.PlateCarree(),
-            linewidth=0.5,
-            facecolor="#9b9b9b",
-            zorder=2
-        ))
-        # ax_loc.add_feature(cfeature.ShapelyFeature(
-        #     Reader(SHAPEFILE_DIR / "ne_50m_admin_0_boundary_lines_land.shp").geometries(),
-        #     ccrs.PlateCarree(),
-        #     linewidth=0.5,
-        #     zorder=2
-        # ))
+        # 地图上的跑步起始点（底图由 make_basemap.py 预渲染）
+        ax_loc = plt.axes([0.75, 0.1, 0.3, 0.3])
         # 调试: 打印经纬度范围和点数量
-        if start_lats and start_lngs:
-            lat_min, lat_max = min(start_lats), max(start_lats)
-            lng_min, lng_max = min(start_lngs), max(start_lngs)
-            print(f"Lat range: {lat_min:.4f} to {lat_max:.4f}")
-            print(f"Lng range: {lng_min:.4f} to {lng_max:.4f}")
+        if len(start_lats) and len(start_lngs):
+            print(f"Lat range: {start_lats.min():.4f} to {start_lats.max():.4f}")
+            print(f"Lng range: {start_lngs.min():.4f} to {start_lngs.max():.4f}")
             print(f"Number of points to plot: {len(start_lats)}")
-            # 设置地图范围，添加动态边距
-            lat_margin = 1.0 if lat_max - lat_min < 10 else 2.0
-            lng_margin = 1.0 if lng_max - lng_min < 10 else 2.0
-            ax_loc.set_extent(
-                [lng_min - lng_margin, lng_max + lng_margin, lat_min - lat_margin, lat_max + lat_margin],
-                crs=ccrs.PlateCarree()
-            )
         else:
             print("No valid lat/lng data to plot, using default extent")
-            ax_loc.set_extent([-180, 180, -90, 90], crs=ccrs.PlateCarree())
+        extent = get_map_extent(start_lats, start_lngs)
+        basemap, basemap_extent = load_basemap(extent)
+        ax_loc.imshow(basemap, extent=basemap_extent, zorder=1)
+        ax_loc.set_xlim(extent[0], extent[1])
+        ax_loc.set_ylim(extent[2], extent[3])
         # 绘制跑步起始点，设置高 zorder
-        if start_lats and start_lngs:
+        if len(start_lats) and len(start_lngs):
             dates_num = mdates.date2num(dts)
-            norm = plt.Normalize(min(dates_num), max(dates_num))
-            colors = plt.cm.coolwarm(norm(dates_num))
-            sizes = [max(5, d * 4) for d in distances]
             ax_loc.scatter(
                 start_lngs,
                 start_lats,
-                s=sizes,
-                c=colors,
+                s=np.maximum(5.0, distances * 4.0),
+                c=dates_num,
+                cmap="coolwarm",
+                norm=plt.Normalize(dates_num.min(), dates_num.max()),
                 alpha=0.3,  # 颜色更淡
                 edgecolors="black",
                 linewidth=0.6,  # 地图上的点的绘制的粗细
-                transform=ccrs.PlateCarree(),
-                zorder=10
+                zorder=10,
+                rasterized=True,
             )
-        ax_loc.tick_params(axis='both', which='major', labelsize='xx-small')
-        ax_loc.spines[['top', 'right']].set_visible(False)
-        ax_loc.spines[['left', 'bottom']].set_linewidth(0.1)
-        ax_loc.spines[['left', 'bottom']].set_color("grey")
+        ax_loc.set_xticks([])
+        ax_loc.set_yticks([])
 
         # 添加跑步者图片
-        img = plt.imread("runner.png")
         ax.add_artist(
             AnnotationBbox(
-                OffsetImage(img, zoom=0.015),
+                OffsetImage(load_runner_img(), zoom=0.015),
                 (0.98, 0.68),
                 xycoords="axes fraction",
                 frameon=False,
             )
         )
-        fig.savefig(OUT_SVG)
+        # 先写临时文件再替换，渲染中断时不会留下残缺的图
+        tmp = out.with_name(out.name + ".tmp")
+        try:
+            if png:
+                fig.savefig(tmp, format="png", dpi=DPI)
+            else:
+                fig.savefig(tmp, format="svg", dpi=DPI, metadata={"Date": None})
+            os.replace(tmp, out)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    # load_basemap 可能重新生成了底图，按最终的输入重新计算摘要
+    hash_file.write_text(get_inputs_digest(out))
 
 
 if __name__ == "__main__":
@@ -1,25 +1,40 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-同步 Strava 与 小米数据，合并为一个 JSON，并生成一张 SVG 跑步统计图。
+同步 Strava 与 小米数据，合并为一个 JSON，并导出 render.py 使用的 CSV。
 输出:
-  - data/running_records_combined.json
-  - data/running_stats.svg
+  - data/running_records_combined.json（合并后的完整记录，唯一的规范 JSON 输出）
+  - data/running.csv
+  - data/last_sync.txt（增量同步的起点）
+  - 设置 RUNNING_SYNC_KEEP_INTERMEDIATE=1 时另外写出中间文件
+    data/running_records_manual_add.json 与 data/running_records_strava_sync.json
+    （仅供本地调试，已在 .gitignore 中忽略，不入库）
 注意:
   - 需要安装 stravalib: pip install stravalib
   - 请把你的 mi 导出文件放在 data/mi_running_history.txt
   - 为安全起见，建议把 CLIENT_SECRET/REFRESH_TOKEN 放到环境变量（当前脚本里为演示硬编码）
 """
 
+import io
 import logging
 import json
 import os
-from datetime import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import chain, repeat
 from pathlib import Path
-import csv
+from typing import Optional, Union
 
 import stravalib  # type: ignore
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # 未安装 orjson 时退回标准库 json
+    orjson = None
+
 # ---- 配置 ----
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
@@ -27,14 +42,29 @@ RECORDS_XIAOMI_HIS = str(DATA_DIR / "mi_running_history.txt")
 MI_OUTPUT_FILE = str(DATA_DIR / "running_records_manual_add.json")
 STRAVA_OUTPUT_FILE = str(DATA_DIR / "running_records_strava_sync.json")
 COMBINED_OUTPUT_FILE = str(DATA_DIR / "running_records_combined.json")
-SVG_OUTPUT_FILE = str(DATA_DIR / "running_stats.svg")
 CSV_OUTPUT_FILE = str(DATA_DIR / "running.csv")
+# 上次同步到的最新一条 Strava 活动的 start_date（UTC）；删除该文件即可全量重新拉取
+LAST_SYNC_FILE = str(DATA_DIR / "last_sync.txt")
+CSV_HEADER = "DT,distance(Km),heart,pace,start_lat,start_lng\r\n"
+
+# 是否写出小米 / Strava 的中间 JSON；下游只读 combined JSON 与 CSV，默认不写
+WRITE_INTERMEDIATE = os.environ.get("RUNNING_SYNC_KEEP_INTERMEDIATE") == "1"
+
+_DT_RE = re.compile(r"(\d{4})([-/])(\d{1,2})\2(\d{1,2})(?:\s+(\d{1,2}):(\d{1,2}):(\d{1,2}))?")
 
 # OAuth（建议改为环境变量）
 CLIENT_ID = os.environ.get("STRAVA_CLIENT_ID")
 CLIENT_SECRET = os.environ.get("STRAVA_CLIENT_SECRET")
 REFRESH_TOKEN = os.environ.get("STRAVA_REFRESH_TOKEN")
 
+# Strava 拉取：起始时间、每页条数，以及同时在途的页请求数（兼顾速率限制）
+STRAVA_SYNC_AFTER = datetime(2010, 1, 1, tzinfo=timezone.utc)
+STRAVA_PER_PAGE = 200
+STRAVA_CONCURRENCY = 4
+# 增量拉取时从 last_sync 往前多取的一段：补上晚同步、补录或重传的活动，以及上次解析失败的活动；
+# 重叠部分按 run_id 去重
+STRAVA_SYNC_LOOKBACK = timedelta(days=7)
+
 # ---- 日志 ----
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("running_sync")
@@ -42,43 +72,119 @@ logger = logging.getLogger("running_sync")
 # ---- client ----
 strava_client = stravalib.Client()
 
+
+@dataclass(slots=True)
+class RunRecord:
+    """一条跑步记录；字段顺序即输出 JSON 的键顺序"""
+    run_id: int
+    name: str
+    distance: float
+    moving_time: float
+    elapsed_time: float
+    type: str
+    start_date: str
+    start_date_local: str
+    location_country: Optional[str]
+    average_heartrate: Optional[float]
+    average_speed: Union[float, str, None]
+    pace: Optional[str]
+    summary_polyline: Optional[str]
+    source: str
+    start_lat: Optional[float] = None
+    start_lng: Optional[float] = None
+
+    def to_dict(self):
+        """转为写 JSON 用的 dict；没有经纬度时不输出这两个键，与原 JSON 结构一致"""
+        d = {name: getattr(self, name) for name in self.__slots__}
+        if self.start_lat is None and self.start_lng is None:
+            del d["start_lat"], d["start_lng"]
+        return d
+
+
+def _write_atomic(path, data):
+    """先整块写入同目录的临时文件再 os.replace，中途被杀也不会留下写了一半的输出"""
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "wb") as fw:
+            fw.write(data)
+            fw.flush()
+            os.fsync(fw.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        # 写入或替换失败时清理临时文件，避免 data/ 里残留 *.tmp
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _dump_json(obj, path):
+    """写出 JSON（UTF-8，缩进 2），优先用 orjson，输出与 json.dump 一致"""
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    else:
+        data = json.dumps(obj, indent=2, ensure_ascii=False).encode("utf8")
+    _write_atomic(path, data)
+
+
+def _load_json(path):
+    """读取 JSON 文件，优先用 orjson"""
+    if orjson is not None:
+        return orjson.loads(Path(path).read_bytes())
+    with open(path, "r", encoding="utf8") as fr:
+        return json.load(fr)
+
+
+def _csv_field(value):
+    """按 csv.QUOTE_MINIMAL 的规则格式化一个字段"""
+    s = "" if value is None else str(value)
+    if "," in s or '"' in s or "\r" in s or "\n" in s:
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+
 def export_csv(records, out_path):
     """导出 CSV 文件: DT, distance(Km), heart, pace, start_lat, start_lng"""
     if not records:
         logger.warning("没有可导出的数据")
         return
 
-    with open(out_path, "w", encoding="utf8", newline="") as fw:
-        writer = csv.writer(fw, delimiter=",")
-        # 写表头
-        writer.writerow(["DT", "distance(Km)", "heart", "pace", "start_lat", "start_lng"])
+    # 表头 + 每条记录一行，写进同一个缓冲区后一次写出；换行与 csv.writer 一样使用 \r\n
+    buf = io.StringIO()
+    w = buf.write
+    w(CSV_HEADER)
+    for r in records:
+        dt = r.start_date_local or r.start_date or ""
+        dist_km = (r.distance or 0) / 1000.0
+        pace = r.pace or "-"
+        w(
+            f"{_csv_field(dt)},{dist_km:.2f},120,{_csv_field(pace)},"
+            f"{_csv_field(r.start_lat)},{_csv_field(r.start_lng)}\r\n"
+        )
 
-        for r in records:
-            dt = r.get("start_date_local") or r.get("start_date") or ""
-            dist_km = (r.get("distance") or 0) / 1000.0
-            pace = r.get("pace") or "-"
-            start_lat = r.get("start_lat", "")
-            start_lng = r.get("start_lng", "")
-            writer.writerow([dt, f"{dist_km:.2f}", 120, pace, start_lat, start_lng])
+    _write_atomic(out_path, buf.getvalue().encode("utf8"))
 
     logger.info("写出 CSV 文件：%s (records=%d)", out_path, len(records))
 
 
+@lru_cache(maxsize=2048)
+def _pace_from_secs(total_seconds):
+    """每公里秒数 -> "m:ss"；常见配速会反复出现，缓存格式化结果"""
+    minutes, seconds = divmod(total_seconds, 60)
+    return f"{minutes}:{seconds:02d}"
+
+
 def calculate_pace(distance_m, moving_time_s):
     """计算配速，返回 mm:ss/km 字符串或 None"""
     try:
         if not distance_m or not moving_time_s:
             return None
         pace_sec_per_km = moving_time_s / (distance_m / 1000.0)
-        total_seconds = int(round(pace_sec_per_km))
-        minutes, seconds = divmod(total_seconds, 60)
-        return "%d:%02d" % (minutes, seconds)
+        return _pace_from_secs(int(round(pace_sec_per_km)))
     except Exception:
         return None
 
 
 def parse_mi_records():
-    """解析小米导出文件 -> 返回 list of dict 与写文件到 MI_OUTPUT_FILE"""
+    """解析小米导出文件 -> 返回 list of RunRecord"""
     results = []
     run_id = 100000  # 与 strava id 区分开
 
@@ -86,82 +192,78 @@ def parse_mi_records():
         logger.warning("小米导出文件不存在：%s，跳过解析", RECORDS_XIAOMI_HIS)
         return results
 
-    with open(RECORDS_XIAOMI_HIS, "r", encoding="utf8") as fr:
-        lines = fr.readlines()
-
-    if len(lines) <= 1:
-        logger.info("小米导出文件只有表头或为空")
-        return results
-
-    raw = lines[1:]
-    logger.info("解析小米记录：%d 行", len(raw))
-
-    for line in raw:
-        parts = line.strip().split()
-        if len(parts) < 8:
-            logger.warning("跳过格式错误行: %s", line.strip())
-            continue
-        try:
-            name = parts[0]
-            # 原始 distance 单位为 km，转换为米
-            distance = round(float(parts[1]) * 1000.0, 1)
-        except Exception:
-            logger.warning("distance 解析失败，跳过: %s", line.strip())
-            continue
-
-        # parse moving_time: 形如 mm:ss 或 hh:mm:ss
-        mt = parts[2]
-        moving_time = 0
-        try:
-            segs = mt.split(":")
-            if len(segs) == 2:
-                moving_time = int(segs[0]) * 60 + int(segs[1])
-            elif len(segs) == 3:
-                moving_time = int(segs[0]) * 3600 + int(segs[1]) * 60 + int(segs[2])
-            else:
-                moving_time = int(float(mt))
-        except Exception:
+    # 逐行流式解析，不把整个导出文件读进内存
+    with open(RECORDS_XIAOMI_HIS, "r", encoding="utf8", buffering=1 << 20) as fr:
+        next(fr, None)  # 跳过表头
+        for line in fr:
+            parts = line.strip().split()
+            if len(parts) < 8:
+                logger.warning("跳过格式错误行: %s", line.strip())
+                continue
+            try:
+                name = parts[0]
+                # 原始 distance 单位为 km，转换为米
+                distance = round(float(parts[1]) * 1000.0, 1)
+            except Exception:
+                logger.warning("distance 解析失败，跳过: %s", line.strip())
+                continue
+
+            # parse moving_time: 形如 mm:ss 或 hh:mm:ss
+            mt = parts[2]
             moving_time = 0
-
-        elapsed_time = moving_time
-        start_date = parts[3] + " " + parts[4]
-        # 尽量确保与 strava 的格式一致：YYYY-MM-DD HH:MM:SS
-        # 若用户导出不是这个格式，合并时会尝试解析，失败则放原始字符串
-        start_date_local = start_date
-        location_country = parts[5]
-        average_heartrate = None if parts[6].lower() == "null" else None
-        try:
-            if parts[6].lower() != "null":
-                average_heartrate = int(parts[6])
-        except Exception:
-            average_heartrate = None
-
-        average_speed = parts[7]  # 保留原始展示
-        pace = calculate_pace(distance, moving_time)
-
-        rec = {
-            "run_id": run_id,
-            "name": name,
-            "distance": distance,
-            "moving_time": moving_time,
-            "elapsed_time": elapsed_time,
-            "type": "Run",
-            "start_date": start_date,
-            "start_date_local": start_date_local,
-            "location_country": location_country,
-            "average_heartrate": average_heartrate,
-            "average_speed": average_speed,
-            "pace": pace,
-            "summary_polyline": None,
-            "source": "mi",
-        }
-        results.append(rec)
-        run_id += 1
-
-    # 写出 MI 输出（保留原样）
-    with open(MI_OUTPUT_FILE, "w", encoding="utf8") as fw:
-        json.dump({"records": results, "data_source": "manual_add"}, fw, indent=2, ensure_ascii=False)
-    logger.info("写出小米解析文件：%s (records=%d)", MI_OUTPUT_FILE, len(results))
+            try:
+                # 小米导出几乎都是两位数的 mm:ss / hh:mm:ss，按固定位置切片；其他形式走通用解析
+                if len(mt) == 5 and mt[2] == ":":
+                    moving_time = int(mt[:2]) * 60 + int(mt[3:])
+                elif len(mt) == 8 and mt[2] == ":" and mt[5] == ":":
+                    moving_time = int(mt[:2]) * 3600 + int(mt[3:5]) * 60 + int(mt[6:])
+                else:
+                    segs = mt.split(":")
+                    if len(segs) == 2:
+                        moving_time = int(segs[0]) * 60 + int(segs[1])
+                    elif len(segs) == 3:
+                        moving_time = int(segs[0]) * 3600 + int(segs[1]) * 60 + int(segs[2])
+                    else:
+                        moving_time = int(float(mt))
+            except Exception:
+                moving_time = 0
+
+            elapsed_time = moving_time
+            start_date = parts[3] + " " + parts[4]
+            # 尽量确保与 strava 的格式一致：YYYY-MM-DD HH:MM:SS
+            # 若用户导出不是这个格式，合并时会尝试解析，失败则放原始字符串
+            start_date_local = start_date
+            location_country = parts[5]
+            average_heartrate = None if parts[6].lower() == "null" else None
+            try:
+                if parts[6].lower() != "null":
+                    average_heartrate = int(parts[6])
+            except Exception:
+                average_heartrate = None
+
+            average_speed = parts[7]  # 保留原始展示
+            pace = calculate_pace(distance, moving_time)
+
+            rec = RunRecord(
+                run_id=run_id,
+                name=name,
+                distance=distance,
+                moving_time=moving_time,
+                elapsed_time=elapsed_time,
+                type="Run",
+                start_date=start_date,
+                start_date_local=start_date_local,
+                location_country=location_country,
+                average_heartrate=average_heartrate,
+                average_speed=average_speed,
+                pace=pace,
+                summary_polyline=None,
+                source="mi",
+            )
+            results.append(rec)
+            run_id += 1
+
+    logger.info("解析小米记录：%d 条", len(results))
     return results
 
 
@@ -180,76 +282,72 @@ def check_access():
         raise
 
 
-def parse_activity(activity):
-    """把 stravalib 返回的 activity 转为 dict，并加上 pace"""
-    distance = 0.0
-    try:
-        distance = float(activity.distance) if activity.distance is not None else 0.0
-    except Exception:
-        distance = 0.0
+def _fmt_dt(dt):
+    """datetime -> "YYYY-MM-DD HH:MM:SS"，直接读取字段，省去 strftime 的格式解释"""
+    if not dt:
+        return ""
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}:{dt.second:02d}"
 
-    moving_time = 0
-    try:
-        moving_time = float(activity.moving_time) if activity.moving_time else 0
-    except Exception:
-        moving_time = 0
 
-    elapsed_time = 0
-    try:
-        elapsed_time = float(activity.elapsed_time) if activity.elapsed_time else moving_time
-    except Exception:
-        elapsed_time = moving_time
-
-    avg_speed = None
-    try:
-        avg_speed = float(activity.average_speed) if activity.average_speed is not None else None
-    except Exception:
-        avg_speed = None
+def parse_activity(activity):
+    """把 stravalib 返回的 activity 转为 RunRecord，并加上 pace"""
+    # stravalib 返回的数值字段要么是 None 要么可直接转 float；转换失败时由调用方跳过整条活动
+    distance = float(activity.distance) if activity.distance is not None else 0.0
+    moving_time = float(activity.moving_time) if activity.moving_time else 0
+    elapsed_time = float(activity.elapsed_time) if activity.elapsed_time else moving_time
+    avg_speed = float(activity.average_speed) if activity.average_speed is not None else None
 
     pace = calculate_pace(distance, moving_time)
 
     # 格式化时间为 "YYYY-MM-DD HH:MM:SS"
-    sd = ""
-    sdl = ""
     try:
-        if getattr(activity, "start_date", None):
-            sd = activity.start_date.strftime("%Y-%m-%d %H:%M:%S")
-        if getattr(activity, "start_date_local", None):
-            sdl = activity.start_date_local.strftime("%Y-%m-%d %H:%M:%S")
+        sd = _fmt_dt(getattr(activity, "start_date", None))
+        sdl = _fmt_dt(getattr(activity, "start_date_local", None))
     except Exception:
         sd = str(getattr(activity, "start_date", ""))
         sdl = str(getattr(activity, "start_date_local", ""))
 
-    rec = {
-        "run_id": activity.id,
-        "name": activity.name,
-        "distance": distance,
-        "moving_time": moving_time,
-        "elapsed_time": elapsed_time,
-        "type": str(activity.sport_type.root),
-        "start_date": sd,
-        "start_date_local": sdl,
-        "location_country": activity.location_country,
-        "average_heartrate": getattr(activity, "average_heartrate", None),
-        "average_speed": avg_speed,
-        "pace": pace,
-        "summary_polyline": None,
-        "source": "strava",
-    }
+    rec = RunRecord(
+        run_id=activity.id,
+        name=activity.name,
+        distance=distance,
+        moving_time=moving_time,
+        elapsed_time=elapsed_time,
+        type=str(activity.sport_type.root),
+        start_date=sd,
+        start_date_local=sdl,
+        location_country=activity.location_country,
+        average_heartrate=getattr(activity, "average_heartrate", None),
+        average_speed=avg_speed,
+        pace=pace,
+        summary_polyline=None,
+        source="strava",
+    )
 
     # 添加经纬度，如果存在
     if activity.start_latlng:
         try:
-            rec["start_lat"] = activity.start_latlng.lat
-            rec["start_lng"] = activity.start_latlng.lon
+            lat, lng = activity.start_latlng.lat, activity.start_latlng.lon
+            rec.start_lat, rec.start_lng = lat, lng
         except Exception:
             pass  # 如果无法提取，不添加
 
     return rec
 
 
-def fetch_strava_activities():
-    """拉取 Strava 活动并写出 STRAVA_OUTPUT_FILE"""
+def fetch_activity_page(page, after):
+    """拉取 /athlete/activities 的第 page 页，返回原始 dict 列表"""
+    return strava_client.protocol.get(
+        "/athlete/activities",
+        check_for_errors=True,
+        after=after,
+        page=page,
+        per_page=STRAVA_PER_PAGE,
+    )
+
+
+def fetch_strava_activities(since=STRAVA_SYNC_AFTER):
+    """拉取 since 之后的 Strava 活动 -> 返回 list of RunRecord"""
     try:
         check_access()
     except Exception:
@@ -257,19 +355,36 @@ def fetch_strava_activities():
         return []
 
     results = []
+    after = int(since.timestamp())
     try:
-        for a in strava_client.get_activities(after="2010-01-01T00:00:00Z"):
-            try:
-                rec = parse_activity(a)
-                results.append(rec)
-            except Exception as e:
-                logger.warning("解析某条 Strava 活动失败，跳过: %s", e)
+        with ThreadPoolExecutor(max_workers=STRAVA_CONCURRENCY) as executor:
+            page = 1
+            while True:
+                # 每批并发请求 STRAVA_CONCURRENCY 页，出现不满一页的结果说明已经取完；
+                # 按页到达的顺序边取边解析，后面几页的网络请求与前面页的解析重叠
+                last_batch = False
+                for items in executor.map(
+                    fetch_activity_page,
+                    range(page, page + STRAVA_CONCURRENCY),
+                    repeat(after),
+                ):
+                    for raw in items:
+                        try:
+                            a = stravalib.model.SummaryActivity.model_validate(
+                                {**raw, "bound_client": strava_client}
+                            )
+                            results.append(parse_activity(a))
+                        except Exception as e:
+                            logger.warning("解析某条 Strava 活动失败，跳过: %s", e)
+                    if len(items) < STRAVA_PER_PAGE:
+                        last_batch = True
+                if last_batch:
+                    break
+                page += STRAVA_CONCURRENCY
     except Exception as e:
         logger.error("拉取 Strava 活动时出错: %s", e)
 
-    with open(STRAVA_OUTPUT_FILE, "w", encoding="utf8") as fw:
-        json.dump({"records": results, "data_source": "strava_sync"}, fw, indent=2, ensure_ascii=False)
-    logger.info("写出 Strava 数据：%s (records=%d)", STRAVA_OUTPUT_FILE, len(results))
+    logger.info("拉取 Strava 活动：%d 条", len(results))
     return results
 
 
@@ -277,12 +392,14 @@ def parse_datetime_safe(s):
     """尝试把时间字符串转换为 datetime，若失败返回 None"""
     if not s:
         return None
-    fmts = ["%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S", "%Y-%m-%d", "%Y/%m/%d"]
-    for f in fmts:
+    # 覆盖 YYYY-MM-DD[ HH:MM:SS] 与 YYYY/MM/DD[ HH:MM:SS]，直接由整数构造，避免逐个格式 strptime 抛异常
+    m = _DT_RE.fullmatch(s)
+    if m:
+        y, _, mo, d, h, mi, sec = m.groups(default="0")
         try:
-            return datetime.strptime(s, f)
-        except Exception:
-            continue
+            return datetime(int(y), int(mo), int(d), int(h), int(mi), int(sec))
+        except ValueError:
+            return None
     # 最后尝试 ISO parse
     try:
         return datetime.fromisoformat(s)
@@ -290,39 +407,90 @@ def parse_datetime_safe(s):
         return None
 
 
-def merge_and_write(mi_recs, strava_recs):
-    """合并两者按时间排序，写出合并 JSON，返回合并列表"""
-    combined = []
-    combined.extend(mi_recs)
-    combined.extend(strava_recs)
-
+def merge_records(mi_recs, strava_recs):
+    """合并两者按时间排序，返回合并列表"""
     # 对没有 start_date 的记录尽量置后，解析 datetime 失败也置后
     def key_func(r):
-        dt = parse_datetime_safe(r.get("start_date_local") or r.get("start_date") or "")
+        dt = parse_datetime_safe(r.start_date_local or r.start_date or "")
         # 将 None 变为 very old? we want None at end -> return (1, None)
         if dt is None:
-            return (1, r.get("run_id", 0))
+            return (1, r.run_id)
         return (0, dt)
 
-    combined_sorted = sorted(combined, key=key_func)
-    with open(COMBINED_OUTPUT_FILE, "w", encoding="utf8") as fw:
-        json.dump({"records": combined_sorted, "data_source": "combined"}, fw, indent=2, ensure_ascii=False)
-    logger.info("写出合并文件：%s (records=%d)", COMBINED_OUTPUT_FILE, len(combined_sorted))
-    return combined_sorted
+    # 直接对两路记录的 chain 排序，省去先拼成一个中间列表
+    return sorted(chain(mi_recs, strava_recs), key=key_func)
+
+
+def write_records(records, data_source, out_path):
+    """把记录列表写出为 {"records": [...], "data_source": ...} 形式的 JSON"""
+    _dump_json({"records": [r.to_dict() for r in records], "data_source": data_source}, out_path)
+    logger.info("写出 JSON 文件：%s (records=%d)", out_path, len(records))
+
+
+def load_last_sync():
+    """读取上次同步的时间点（UTC），不存在或无法解析时返回 None"""
+    try:
+        text = Path(LAST_SYNC_FILE).read_text(encoding="utf8").strip()
+    except OSError:
+        return None
+    dt = parse_datetime_safe(text)
+    return dt.replace(tzinfo=timezone.utc) if dt else None
+
+
+def load_previous_strava():
+    """从上次的合并 JSON 中取回 Strava 记录，文件不存在或损坏时返回 None"""
+    try:
+        records = _load_json(COMBINED_OUTPUT_FILE)["records"]
+        return [RunRecord(**d) for d in records if d.get("source") == "strava"]
+    except Exception as e:
+        logger.warning("读取上次的合并文件失败，改为全量拉取: %s", e)
+        return None
+
+
+def sync_strava():
+    """增量同步 Strava：只拉 last_sync 往前回看 STRAVA_SYNC_LOOKBACK 之后的活动，与上次的记录按 run_id 去重合并"""
+    since = load_last_sync()
+    previous = load_previous_strava() if since else None
+    # 没有可用的旧 Strava 记录时（包括旧记录为空）只能全量拉取，否则会丢掉更早的历史
+    if not previous:
+        logger.info("全量拉取 Strava 活动（自 %s 起）", STRAVA_SYNC_AFTER.date())
+        return fetch_strava_activities()
+
+    since -= STRAVA_SYNC_LOOKBACK
+    logger.info("增量拉取 Strava 活动（自 %s 起，已有 %d 条）", since, len(previous))
+    fresh = fetch_strava_activities(since)
+    # 新拉到的记录覆盖同 run_id 的旧记录
+    merged = {r.run_id: r for r in chain(previous, fresh)}
+    return list(merged.values())
 
 
 def main():
     # 1) 解析小米
     mi = parse_mi_records()
 
-    # 2) 拉 Strava
-    strava = fetch_strava_activities()
-
-    # 3) 合并并写出 combined json
-    combined = merge_and_write(mi, strava)
-
-    # 5) 导出 CSV
-    export_csv(combined, CSV_OUTPUT_FILE)
+    # 2) 拉 Strava（增量）
+    strava = sync_strava()
+
+    # 3) 合并
+    combined = merge_records(mi, strava)
+
+    # 4) 并发写出各 JSON 与 CSV；解析/拉取被跳过（结果为空）时保留旧的中间文件
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = []
+        if WRITE_INTERMEDIATE and mi:
+            futures.append(executor.submit(write_records, mi, "manual_add", MI_OUTPUT_FILE))
+        if WRITE_INTERMEDIATE and strava:
+            futures.append(executor.submit(write_records, strava, "strava_sync", STRAVA_OUTPUT_FILE))
+        futures.append(executor.submit(write_records, combined, "combined", COMBINED_OUTPUT_FILE))
+        futures.append(executor.submit(export_csv, combined, CSV_OUTPUT_FILE))
+        for f in futures:
+            f.result()
+
+    # 5) 记录本次同步到的最新活动时间，作为下次增量拉取的起点
+    last_sync = max((r.start_date for r in strava if r.start_date), default="")
+    if last_sync:
+        _write_atomic(LAST_SYNC_FILE, (last_sync + "\n").encode("utf8"))
+        logger.info("更新同步时间点：%s", last_sync)
 
 
 if __name__ == "__main__":